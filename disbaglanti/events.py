@@ -0,0 +1,123 @@
+import json
+import re
+import time
+from django.conf import settings
+from celery.utils.log import get_task_logger
+
+try:
+    import redis
+except ImportError:  # redis kurulu değilse yayın devre dışı kalır
+    redis = None
+
+logger = get_task_logger(__name__)
+
+LONG_POLL_TIMEOUT = getattr(settings, 'BROKEN_LINK_EVENTS_POLL_TIMEOUT', 10)
+RECONNECT_DELAY_MS = 1000
+REDIS_SOCKET_TIMEOUT = 1
+REDIS_RETRY_AFTER = 30
+EVENT_STREAM_MAXLEN = 50000
+EVENT_STREAM_TTL = 24 * 3600
+EVENT_ID_RE = re.compile(r'^\d+-\d+$')
+_clients = {}
+_disabled_until = 0
+
+def get_redis_client(socket_timeout=REDIS_SOCKET_TIMEOUT):
+    """
+    Redis istemcisini döndürür. Redis tanımlı değilse veya son hatadan sonra REDIS_RETRY_AFTER saniye
+    geçmediyse None döner; böylece erişilemeyen Redis analizi yavaşlatmaz.
+    """
+    if redis is None or time.monotonic() < _disabled_until:
+        return None
+    if socket_timeout not in _clients:
+        url = getattr(settings, 'BROKEN_LINK_EVENTS_REDIS_URL', None) or getattr(settings, 'CELERY_BROKER_URL', None)
+        if not (url and url.startswith(('redis://', 'rediss://', 'unix://'))):
+            return None
+        _clients[socket_timeout] = redis.Redis.from_url(url, socket_connect_timeout=REDIS_SOCKET_TIMEOUT, socket_timeout=socket_timeout)
+    return _clients[socket_timeout]
+
+def disable_redis(error):
+    global _disabled_until
+    _disabled_until = time.monotonic() + REDIS_RETRY_AFTER
+    logger.warning(f"Redis unavailable, analysis events disabled for {REDIS_RETRY_AFTER}s: {str(error)}")
+
+def project_stream(project_id):
+    return f"disbaglanti:analysis:{project_id}:events"
+
+def publish_event(project_id, event, data):
+    """
+    Analiz olayını projenin Redis Stream'ine ekler. Her olay bir id alır; yeniden bağlanan istemciler
+    Last-Event-ID ile kaçırdıkları olayları alır. Yayın hatası analizi durdurmaz.
+    """
+    client = get_redis_client()
+    if client is None:
+        return
+    key = project_stream(project_id)
+    try:
+        pipe = client.pipeline(transaction=False)
+        pipe.xadd(key, {'event': event, 'data': json.dumps(data)}, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+        pipe.expire(key, EVENT_STREAM_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        disable_redis(e)
+
+def format_sse(event, data, event_id=None):
+    prefix = f"id: {event_id}\n" if event_id else ""
+    return f"{prefix}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def decode_entry(entry_id, fields):
+    return entry_id.decode(), fields[b'event'].decode(), json.loads(fields[b'data'])
+
+def stream_events(project_id, get_status, last_event_id=None, timeout=None):
+    """
+    Sınırlı süreli (long-poll) server-sent events üreticisi. Olaylar projenin Redis Stream'inden id'leriyle
+    okunur; last_event_id (Last-Event-ID) verilirse ondan sonraki olaylar yeniden gönderilir, böylece
+    yeniden bağlanma arasında yayınlanan kırık linkler kaybolmaz.
+    Akış en fazla timeout (BROKEN_LINK_EVENTS_POLL_TIMEOUT) saniye sürer ve EventSource RECONNECT_DELAY_MS sonra
+    yeniden bağlanır; 'done', 'error' veya 'unavailable' olayından sonra istemci bağlantıyı kapatmalıdır.
+    """
+    timeout = LONG_POLL_TIMEOUT if timeout is None else timeout
+    yield f"retry: {RECONNECT_DELAY_MS}\n\n"
+    client = get_redis_client(socket_timeout=timeout + REDIS_SOCKET_TIMEOUT)
+    key = project_stream(project_id)
+    start_id = None
+    if client is not None:
+        try:
+            if last_event_id and EVENT_ID_RE.match(last_event_id):
+                start_id = last_event_id
+            else:
+                # Durum okunmadan önceki son olaydan başlanır; arada yayınlanan olay kaçmaz
+                latest = client.xrevrange(key, count=1)
+                start_id = latest[0][0].decode() if latest else '0-0'
+        except redis.RedisError as e:
+            disable_redis(e)
+
+    status = get_status()
+    yield format_sse('status', status)
+    if start_id is None:
+        yield format_sse('unavailable', status)
+        return
+
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            if status.get('is_analyzing'):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                block = max(1, int(remaining * 1000))
+            else:
+                # Analiz bitmişse yalnızca kalan olaylar beklemeden okunur
+                block = None
+            response = client.xread({key: start_id}, count=500, block=block)
+            entries = response[0][1] if response else []
+            for entry_id, fields in entries:
+                start_id, event, data = decode_entry(entry_id, fields)
+                yield format_sse(event, data, start_id)
+                if event in ('done', 'error'):
+                    return
+            if block is None and not entries:
+                yield format_sse('done', status)
+                return
+    except redis.RedisError as e:
+        disable_redis(e)
+        yield format_sse('unavailable', status)
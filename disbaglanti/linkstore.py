@@ -0,0 +1,113 @@
+from array import array
+from .utils import SOFT_404_STATUS
+
+# Hedef URL durum kodları: pozitif değerler HTTP durum kodudur
+UNCHECKED = -1
+VALID = 0
+NO_RESPONSE = -2
+SEO_WARNING = -3
+SOFT_404 = -4
+SKIPPED = -5
+
+STATUS_NAMES = {
+    NO_RESPONSE: 'No Response',
+    SEO_WARNING: 'SEO Warning',
+    SOFT_404: SOFT_404_STATUS,
+}
+STATUS_CODES = {name: code for code, name in STATUS_NAMES.items()}
+
+def encode_status(status):
+    if status in STATUS_CODES:
+        return STATUS_CODES[status]
+    return int(status)
+
+def decode_status(code):
+    return STATUS_NAMES.get(code, str(code))
+
+class UrlTable:
+    """
+    Analiz boyunca her URL'yi bir kez saklar ve tamsayı id'ye eşler.
+    Kontrol sonucu URL başına tutulur; aynı hedefe giden linkler yeniden kontrol edilmez.
+    Bağlam metni yalnızca kırık URL'ler için saklanır.
+    """
+    __slots__ = ('ids', 'urls', 'statuses', 'contexts')
+
+    def __init__(self):
+        self.ids = {}
+        self.urls = []
+        self.statuses = array('h')
+        self.contexts = {}
+
+    def __len__(self):
+        return len(self.urls)
+
+    def intern(self, url):
+        url_id = self.ids.get(url)
+        if url_id is None:
+            url_id = len(self.urls)
+            self.ids[url] = url_id
+            self.urls.append(url)
+            self.statuses.append(UNCHECKED)
+        return url_id
+
+    def url(self, url_id):
+        return self.urls[url_id]
+
+    def lookup(self, url):
+        return self.ids.get(url)
+
+    def is_checked(self, url_id):
+        return self.statuses[url_id] != UNCHECKED
+
+    def is_skipped(self, url_id):
+        return self.statuses[url_id] == SKIPPED
+
+    def is_broken(self, url_id):
+        return self.statuses[url_id] not in (UNCHECKED, VALID, SKIPPED)
+
+    def set_skipped(self, url_id):
+        self.statuses[url_id] = SKIPPED
+
+    def set_result(self, url_id, result):
+        """check_link sonucunu (None veya {'status', 'context'}) kaydeder."""
+        if result:
+            self.statuses[url_id] = encode_status(result['status'])
+            self.contexts[url_id] = result['context']
+        else:
+            self.statuses[url_id] = VALID
+
+    def status(self, url_id):
+        return decode_status(self.statuses[url_id])
+
+    def context(self, url_id):
+        return self.contexts.get(url_id)
+
+class LinkRecords:
+    """
+    Kaynak -> hedef linklerini UrlTable id'leri olarak iki sütunda tutar (link başına 8 bayt).
+    """
+    __slots__ = ('url_table', 'sources', 'targets')
+
+    def __init__(self, url_table):
+        self.url_table = url_table
+        self.sources = array('I')
+        self.targets = array('I')
+
+    def __len__(self):
+        return len(self.targets)
+
+    def add(self, source_url, target_url):
+        self.sources.append(self.url_table.intern(source_url))
+        self.targets.append(self.url_table.intern(target_url))
+        return len(self.targets) - 1
+
+    def iter_broken(self, start=0):
+        """start indeksinden itibaren hedefi kırık olan (source_url, broken_url, status, context) kayıtlarını döndürür."""
+        url_table = self.url_table
+        seen = set()
+        for index in range(start, len(self.targets)):
+            source_id, target_id = self.sources[index], self.targets[index]
+            if not url_table.is_broken(target_id) or (source_id, target_id) in seen:
+                continue
+            seen.add((source_id, target_id))
+            yield url_table.url(source_id), url_table.url(target_id), url_table.status(target_id), url_table.context(target_id)
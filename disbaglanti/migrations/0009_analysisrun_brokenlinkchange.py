@@ -0,0 +1,45 @@
+# Generated by Django 4.2.16 on 2026-10-19 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disbaglanti', '0008_remove_brokenlink_project'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('total_links', models.IntegerField(default=0)),
+                ('broken_links', models.IntegerField(default=0)),
+                ('no_response_links', models.IntegerField(default=0)),
+                ('new_count', models.IntegerField(default=0)),
+                ('fixed_count', models.IntegerField(default=0)),
+                ('changed_count', models.IntegerField(default=0)),
+                ('analysis_result', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='disbaglanti.analysisresult')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BrokenLinkChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_url', models.URLField()),
+                ('broken_url', models.URLField()),
+                ('change_type', models.CharField(choices=[('new', 'Newly broken'), ('fixed', 'Fixed'), ('status_changed', 'Status changed')], max_length=20)),
+                ('old_status_code', models.CharField(blank=True, max_length=20, null=True)),
+                ('new_status_code', models.CharField(blank=True, max_length=20, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='disbaglanti.analysisrun')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-19 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('disbaglanti', '0009_analysisrun_brokenlinkchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisrun',
+            name='is_partial',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -25,6 +25,41 @@ class BrokenLink(models.Model):
     def project(self):
         return self.analysis_result.project
 
+class AnalysisRun(models.Model):
+    analysis_result = models.ForeignKey(AnalysisResult, on_delete=models.CASCADE, related_name='runs')
+    started_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    total_links = models.IntegerField(default=0)
+    broken_links = models.IntegerField(default=0)
+    no_response_links = models.IntegerField(default=0)
+    new_count = models.IntegerField(default=0)
+    fixed_count = models.IntegerField(default=0)
+    changed_count = models.IntegerField(default=0)
+    is_partial = models.BooleanField(default=False)  # Süre sınırı nedeniyle bazı linkler kontrol edilmedi
+    def __str__(self):
+        return f"Analysis Run for {self.analysis_result.project.name} - {self.started_at}"
+    class Meta:
+        ordering = ['-started_at']
+
+class BrokenLinkChange(models.Model):
+    # Her çalıştırmada yalnızca bir önceki çalıştırmaya göre değişen linkler saklanır
+    NEW = 'new'
+    FIXED = 'fixed'
+    STATUS_CHANGED = 'status_changed'
+    CHANGE_TYPES = [
+        (NEW, 'Newly broken'),
+        (FIXED, 'Fixed'),
+        (STATUS_CHANGED, 'Status changed'),
+    ]
+    run = models.ForeignKey(AnalysisRun, on_delete=models.CASCADE, related_name='changes')
+    source_url = models.URLField()
+    broken_url = models.URLField()
+    change_type = models.CharField(max_length=20, choices=CHANGE_TYPES)
+    old_status_code = models.CharField(max_length=20, blank=True, null=True)
+    new_status_code = models.CharField(max_length=20, blank=True, null=True)
+    def __str__(self):
+        return f"{self.change_type}: {self.source_url} -> {self.broken_url}"
+
 class BrokenLinkAnalysisStatus(models.Model):
     project = models.OneToOneField(Project, on_delete=models.CASCADE, related_name='broken_link_analysis_status')
     is_analyzing = models.BooleanField(default=False)
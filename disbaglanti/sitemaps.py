@@ -0,0 +1,175 @@
+import gzip
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from urllib.parse import urlparse, urljoin
+from urllib.robotparser import RobotFileParser
+from xml.etree.ElementTree import iterparse, ParseError
+import requests
+from requests.exceptions import RequestException
+from celery.utils.log import get_task_logger
+from .utils import REQUEST_HEADERS
+
+logger = get_task_logger(__name__)
+
+ROBOTS_USER_AGENT = '*'
+MAX_SITEMAP_DEPTH = 3
+HOST_CONCURRENCY = 4
+
+def get_host(url):
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+def fetch_robots(host):
+    """
+    Host'un robots.txt dosyasını okur. Dosya yoksa veya okunamazsa her şeye izin veren bir parser döner.
+    """
+    parser = RobotFileParser(urljoin(host, '/robots.txt'))
+    try:
+        response = requests.get(parser.url, timeout=10, headers=REQUEST_HEADERS)
+        if response.status_code < 400:
+            parser.parse(response.text.splitlines())
+        else:
+            parser.parse([])
+    except RequestException as e:
+        logger.warning(f"Could not fetch robots.txt for {host}: {str(e)}")
+        parser.parse([])
+    return parser
+
+class RobotsPolicy:
+    """
+    Host başına robots.txt kurallarını ve crawl-delay süresini uygular. Thread-safe'tir: slot() aynı host'a
+    en fazla HOST_CONCURRENCY eşzamanlı kontrol, crawl-delay tanımlıysa tek kontrol sağlar. Bir kontrol birden fazla
+    istek (HEAD, GET, tekrar denemeler, soft 404 istekleri) gönderebildiği için wait() check_link'e throttle olarak
+    verilir ve her istekten önce çağrılır.
+    """
+    def __init__(self, user_agent=ROBOTS_USER_AGENT, host_concurrency=HOST_CONCURRENCY):
+        self.user_agent = user_agent
+        self.host_concurrency = host_concurrency
+        self.parsers = {}
+        self.semaphores = {}
+        self.last_request = {}
+        self.lock = threading.Lock()
+
+    def get_parser(self, url):
+        # robots.txt kilit dışında indirilir; aynı host'u isteyen diğer thread'ler yalnızca o host'un Future'ını bekler
+        host = get_host(url)
+        with self.lock:
+            future = self.parsers.get(host)
+            is_owner = future is None
+            if is_owner:
+                future = self.parsers[host] = Future()
+        if is_owner:
+            try:
+                future.set_result(fetch_robots(host))
+            except Exception as e:
+                future.set_exception(e)
+        return future.result()
+
+    def can_fetch(self, url):
+        return self.get_parser(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        delay = self.get_parser(url).crawl_delay(self.user_agent)
+        return float(delay) if delay else 0
+
+    def wait(self, url):
+        delay = self.crawl_delay(url)
+        host = get_host(url)
+        if delay:
+            elapsed = time.monotonic() - self.last_request.get(host, 0)
+            if elapsed < delay:
+                time.sleep(delay - elapsed)
+        self.last_request[host] = time.monotonic()
+
+    @contextmanager
+    def slot(self, url):
+        host = get_host(url)
+        delay = self.crawl_delay(url)
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.Semaphore(1 if delay else self.host_concurrency)
+            semaphore = self.semaphores[host]
+        with semaphore:
+            yield
+
+    def sitemaps(self, url):
+        return self.get_parser(url).site_maps() or [urljoin(get_host(url), '/sitemap.xml')]
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def download_sitemap(sitemap_url):
+    """
+    Sitemap'i geçici bir dosyaya indirir ve dosyayı başa sarılmış halde döndürür.
+    Bağlantı ayrıştırma ve link kontrolü sırasında açık kalmaz. İndirilemezse None döner.
+    """
+    spool = tempfile.TemporaryFile()
+    try:
+        with requests.get(sitemap_url, timeout=30, headers=REQUEST_HEADERS, stream=True) as response:
+            if response.status_code >= 400:
+                logger.warning(f"Sitemap {sitemap_url} returned {response.status_code}")
+                spool.close()
+                return None
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                spool.write(chunk)
+    except RequestException as e:
+        logger.warning(f"Could not fetch sitemap {sitemap_url}: {str(e)}")
+        spool.close()
+        return None
+    spool.seek(0)
+    return spool
+
+def iter_sitemap_urls(sitemap_url, depth=0):
+    """
+    Sitemap'i (gzip'li olabilir) geçici dosyaya indirip akış halinde ayrıştırarak içindeki sayfa URL'lerini döndürür.
+    Sitemap index dosyalarındaki alt sitemap'ler de MAX_SITEMAP_DEPTH derinliğine kadar okunur.
+    Elemanlar işlendikçe temizlendiği için bellek kullanımı sitemap boyutundan bağımsızdır.
+    """
+    spool = download_sitemap(sitemap_url)
+    if spool is None:
+        return
+    # .xml.gz dosyaları Content-Encoding olmadan gelir; gzip imzasına bakılır
+    is_gzip = spool.read(2) == b'\x1f\x8b'
+    spool.seek(0)
+    stream = gzip.GzipFile(fileobj=spool) if is_gzip else spool
+
+    child_sitemaps = []
+    root = None
+    is_index = False
+    try:
+        for event, elem in iterparse(stream, events=('start', 'end')):
+            name = local_name(elem.tag)
+            if event == 'start':
+                if root is None:
+                    root = elem
+                    is_index = name == 'sitemapindex'
+                continue
+            if name == 'loc' and elem.text:
+                loc = elem.text.strip()
+                if is_index:
+                    child_sitemaps.append(loc)
+                else:
+                    yield loc
+            elif name in ('url', 'sitemap'):
+                elem.clear()
+                root.clear()
+    except (ParseError, OSError, EOFError) as e:
+        logger.warning(f"Could not parse sitemap {sitemap_url}: {str(e)}")
+    finally:
+        stream.close()
+        spool.close()
+
+    if depth < MAX_SITEMAP_DEPTH:
+        for child in child_sitemaps:
+            yield from iter_sitemap_urls(child, depth + 1)
+
+def iter_site_sitemap_urls(site_url, robots_policy):
+    """
+    robots.txt'de listelenen (yoksa /sitemap.xml) tüm sitemap'lerdeki URL'leri (sitemap_url, url) olarak döndürür.
+    """
+    for sitemap_url in robots_policy.sitemaps(site_url):
+        for url in iter_sitemap_urls(sitemap_url):
+            yield sitemap_url, url
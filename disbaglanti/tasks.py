@@ -2,20 +2,35 @@ import requests
 from celery import shared_task, group, chord
 from celery.result import AsyncResult
 from .utils import check_broken_links
-from .models import Project, BrokenLink, BrokenLinkAnalysisStatus, Content, AnalysisResult
+from .models import Project, BrokenLink, BrokenLinkAnalysisStatus, Content, AnalysisResult, AnalysisRun, BrokenLinkChange
 from project_management.models import Project
 from django.utils import timezone
 from celery.utils.log import get_task_logger
-from .utils import check_link, should_check_link
+from .utils import check_link, should_check_link, is_valid_url, extract_link_urls
+from .linkstore import UrlTable, LinkRecords
+from .events import publish_event
+from .sitemaps import RobotsPolicy, get_host, iter_site_sitemap_urls
 from urllib.parse import urljoin
 from bs4 import BeautifulSoup
 import logging
-from itertools import islice
+from itertools import islice, chain
+from collections import Counter
 from django.db import transaction
+from django.db.models import Q
+from concurrent.futures import ThreadPoolExecutor
+import time
+from functools import reduce
+import operator
 from celery.exceptions import SoftTimeLimitExceeded
 
 logger = get_task_logger(__name__)
 
+SITEMAP_CHUNK_SIZE = 500
+SITEMAP_CONTEXT_PREFIX = 'Listed in sitemap'
+SITEMAP_WORKERS = 8
+ANALYSIS_TIME_BUDGET = 3300
+OUT_OF_TIME = object()
+
 def chunked_iterable(iterable, size):
     it = iter(iterable)
     while True:
@@ -24,6 +39,102 @@ def chunked_iterable(iterable, size):
             break
         yield chunk
 
+def get_link_statuses(analysis_result):
+    return {
+        (source_url, broken_url): status_code
+        for source_url, broken_url, status_code in BrokenLink.objects.filter(analysis_result=analysis_result).values_list('source_url', 'broken_url', 'status_code').iterator()
+    }
+
+def delete_link_pairs(analysis_result, pairs, batch_size=500):
+    """
+    Yalnızca verilen (source_url, broken_url) çiftlerini siler; kaynak ve hedef listeleri ayrı ayrı eşleştirilmez.
+    """
+    for chunk in chunked_iterable(pairs, batch_size):
+        condition = reduce(operator.or_, (Q(source_url=source_url, broken_url=broken_url) for source_url, broken_url in chunk))
+        BrokenLink.objects.filter(condition, analysis_result=analysis_result).delete()
+
+def keep_unchecked_pairs(existing_links, url_table, content_source_ids, sitemap_pairs):
+    """
+    Bu çalıştırmada kontrol edilmeyen önceki kırık link çiftlerini existing_links'ten çıkarır; böylece silinmezler
+    ve geçmişe 'düzeldi' olarak yazılmazlar:
+    - içerik sayfasından gelen ve hedefi kontrol edilmeyen (robots.txt engeli, süre sınırı) çiftler,
+    - sitemap'ten gelen ve hedefi kontrol edilmeyen ya da hâlâ kırık olan çiftler (sitemap'in tamamı okunmamış olabilir).
+    Kaynak sayfası artık olmayan çiftler silinmeye devam eder.
+    """
+    for source_url, broken_url in list(existing_links):
+        target_id = url_table.lookup(broken_url)
+        if (source_url, broken_url) in sitemap_pairs:
+            if target_id is None or not url_table.is_checked(target_id) or url_table.is_skipped(target_id) or url_table.is_broken(target_id):
+                existing_links.discard((source_url, broken_url))
+        elif url_table.lookup(source_url) in content_source_ids and target_id is not None:
+            # İçerik sayfaları her zaman baştan sona okunur; hedef tabloda yoksa link sayfadan kaldırılmıştır
+            if not url_table.is_checked(target_id) or url_table.is_skipped(target_id):
+                existing_links.discard((source_url, broken_url))
+
+def record_analysis_run(analysis_result, previous_statuses, started_at, total_links, is_partial=False):
+    """
+    Çalıştırmanın özetini ve önceki çalıştırmaya göre değişen linkleri (yeni, düzelen, durumu değişen) kaydeder.
+    """
+    current_statuses = get_link_statuses(analysis_result)
+    changes = []
+    for (source_url, broken_url), status_code in current_statuses.items():
+        old_status_code = previous_statuses.get((source_url, broken_url))
+        if old_status_code is None:
+            changes.append(BrokenLinkChange(source_url=source_url, broken_url=broken_url, change_type=BrokenLinkChange.NEW, new_status_code=status_code))
+        elif old_status_code != status_code:
+            changes.append(BrokenLinkChange(source_url=source_url, broken_url=broken_url, change_type=BrokenLinkChange.STATUS_CHANGED, old_status_code=old_status_code, new_status_code=status_code))
+    for (source_url, broken_url), old_status_code in previous_statuses.items():
+        if (source_url, broken_url) not in current_statuses:
+            changes.append(BrokenLinkChange(source_url=source_url, broken_url=broken_url, change_type=BrokenLinkChange.FIXED, old_status_code=old_status_code))
+
+    with transaction.atomic():
+        run = AnalysisRun.objects.create(
+            analysis_result=analysis_result,
+            started_at=started_at,
+            finished_at=timezone.now(),
+            total_links=total_links,
+            broken_links=len(current_statuses),
+            no_response_links=BrokenLink.objects.filter(analysis_result=analysis_result, is_no_response=True).count(),
+            new_count=sum(1 for change in changes if change.change_type == BrokenLinkChange.NEW),
+            fixed_count=sum(1 for change in changes if change.change_type == BrokenLinkChange.FIXED),
+            changed_count=sum(1 for change in changes if change.change_type == BrokenLinkChange.STATUS_CHANGED),
+            is_partial=is_partial,
+        )
+        for change in changes:
+            change.run = run
+        BrokenLinkChange.objects.bulk_create(changes, batch_size=1000)
+    return run
+
+def save_broken_records(analysis_result, records, start, existing_links, project_id, context_prefix=None):
+    """
+    records içinde start indeksinden sonraki kırık linkleri toplu olarak kaydeder (varsa günceller).
+    """
+    broken_links = []
+    for source_url, broken_url, status_code, context in records.iter_broken(start):
+        if context_prefix:
+            context = f"{context_prefix} {source_url}\n{context}"
+        broken_links.append(BrokenLink(
+            analysis_result=analysis_result,
+            source_url=source_url,
+            broken_url=broken_url,
+            status_code=status_code,
+            context=context,
+            is_no_response=status_code == 'No Response'
+        ))
+        existing_links.discard((source_url, broken_url))
+        publish_event(project_id, 'broken_link', {
+            'source_url': source_url,
+            'broken_url': broken_url,
+            'status_code': status_code,
+            'is_no_response': status_code == 'No Response',
+        })
+    BrokenLink.objects.bulk_create(
+        broken_links,
+        update_conflicts=True,
+        unique_fields=['analysis_result', 'source_url', 'broken_url'],
+        update_fields=['status_code', 'context', 'is_no_response', 'checked_at'],
+    )
+
 @shared_task
 def check_single_link(url, source_url, project_id):
     if should_check_link(url):
@@ -86,7 +197,7 @@ def save_results(self, results, project_id):
 
 
 @shared_task(bind=True, soft_time_limit=3600, time_limit=3660)
-def analyze_broken_links_task(self, project_id):
+def analyze_broken_links_task(self, project_id, detect_soft_404=False, discover_sitemaps=False):
     project = Project.objects.get(id=project_id)
     
     status, _ = BrokenLinkAnalysisStatus.objects.get_or_create(project=project)
@@ -98,6 +209,9 @@ def analyze_broken_links_task(self, project_id):
         status.save()
 
     try:
+        run_started_at = timezone.now()
+        # soft_time_limit'e ulaşmadan önce temizlik ve geçmiş kaydı için pay bırakılır
+        task_deadline = time.monotonic() + ANALYSIS_TIME_BUDGET
         contents = Content.objects.filter(project=project)
         total_links = 0
         analysis_result, _ = AnalysisResult.objects.update_or_create(
@@ -105,47 +219,115 @@ def analyze_broken_links_task(self, project_id):
             defaults={'last_updated': timezone.now()}
         )
         
-        existing_links = set(BrokenLink.objects.filter(analysis_result=analysis_result).values_list('source_url', 'broken_url'))
+        previous_statuses = get_link_statuses(analysis_result)
+        existing_links = set(previous_statuses)
+        # Host başına soft 404 parmak izleri; tespit kapalıysa None
+        soft_404_fingerprints = {} if detect_soft_404 else None
+        # Sitemap keşfi açıksa robots.txt kuralları ve crawl-delay tüm kontrollerde uygulanır
+        robots_policy = RobotsPolicy() if discover_sitemaps else None
 
-        for content in contents:
-            soup = BeautifulSoup(content.raw_content, 'html.parser')
-            links = soup.find_all(['a', 'link', 'script', 'img'], href=True) + soup.find_all(['a', 'link', 'script', 'img'], src=True)
-            total_links += len(links)
+        url_table = UrlTable()
+        records = LinkRecords(url_table)
+        content_source_ids = set()
+        site_hosts = Counter()
+        is_partial = False
 
-            for link in links:
-                href = link.get('href') or link.get('src')
+        def check_target(target_id, source_url):
+            if url_table.is_checked(target_id):
+                return
+            url = url_table.url(target_id)
+            if robots_policy is not None and is_valid_url(url) and should_check_link(url):
+                if not robots_policy.can_fetch(url):
+                    url_table.set_skipped(target_id)
+                    return
+                store_result(target_id, check_in_slot(url, source_url))
+                return
+            url_table.set_result(target_id, check_link(url, source_url, soft_404_fingerprints=soft_404_fingerprints))
 
+        def check_in_slot(url, source_url):
+            # Host eşzamanlılık sınırı ve crawl-delay içinde kontrol eder; süre bittiyse kontrol etmez
+            with robots_policy.slot(url):
+                if time.monotonic() > task_deadline:
+                    return OUT_OF_TIME
+                return check_link(url, source_url, soft_404_fingerprints=soft_404_fingerprints, throttle=robots_policy.wait)
+
+        def store_result(target_id, result):
+            nonlocal is_partial
+            if result is OUT_OF_TIME:
+                is_partial = True
+                url_table.set_skipped(target_id)
+            else:
+                url_table.set_result(target_id, result)
+
+        for content in contents:
+            hrefs = extract_link_urls(content.raw_content)
+            total_links += len(hrefs)
+            first_record = len(records)
+            content_source_ids.add(url_table.intern(content.url))
+            site_hosts[get_host(content.url)] += 1
+
+            for href in hrefs:
                 if href is not None:
-                    full_url = urljoin(content.url, href)
-                    result = check_link(full_url, content.url)
-
-                    if result:
-                        link_tuple = (content.url, full_url)
-                        BrokenLink.objects.update_or_create(
-                            analysis_result=analysis_result,
-                            source_url=content.url,
-                            broken_url=full_url,
-                            defaults={
-                                'status_code': result['status'],
-                                'context': result['context'],
-                                'is_no_response': result['status'] == 'No Response'
-                            }
-                        )
-                        existing_links.discard(link_tuple)
-
-            status.progress += len(links)
+                    index = records.add(content.url, urljoin(content.url, href))
+                    check_target(records.targets[index], content.url)
+
+            save_broken_records(analysis_result, records, first_record, existing_links, project_id)
+            status.progress += len(hrefs)
             status.save()
             self.update_state(state='PROGRESS', meta={'current': status.progress, 'total': total_links})
+            publish_event(project_id, 'progress', {'progress': status.progress, 'total_links': total_links})
+
+        if robots_policy is not None and site_hosts:
+            # Projenin içeriklerinin bulunduğu her host için sitemap okunur (en çok içeriği olan host önce)
+            sitemap_urls = chain.from_iterable(iter_site_sitemap_urls(host, robots_policy) for host, _ in site_hosts.most_common())
+            chunks = chunked_iterable(sitemap_urls, SITEMAP_CHUNK_SIZE)
+            executor = ThreadPoolExecutor(max_workers=SITEMAP_WORKERS)
+            try:
+                while True:
+                    if time.monotonic() > task_deadline:
+                        # Kalan sitemap URL'leri kontrol edilmez; eski kayıtları korunur ve çalıştırma kısmi işaretlenir
+                        logger.warning(f"Sitemap check for project {project_id} stopped after reaching the time budget.")
+                        is_partial = True
+                        break
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    first_record = len(records)
+                    pending = {}
+                    for sitemap_url, url in chunk:
+                        index = records.add(sitemap_url, url)
+                        target_id = records.targets[index]
+                        if url_table.is_checked(target_id) or target_id in pending:
+                            continue
+                        if not (is_valid_url(url) and should_check_link(url)):
+                            url_table.set_result(target_id, check_link(url, sitemap_url))
+                        elif not robots_policy.can_fetch(url):
+                            url_table.set_skipped(target_id)
+                        else:
+                            pending[target_id] = executor.submit(check_in_slot, url, sitemap_url)
+                    for target_id, future in pending.items():
+                        store_result(target_id, future.result())
+                    save_broken_records(analysis_result, records, first_record, existing_links, project_id, context_prefix=SITEMAP_CONTEXT_PREFIX)
+                    total_links += len(chunk)
+                    status.progress += len(chunk)
+                    status.save()
+                    self.update_state(state='PROGRESS', meta={'current': status.progress, 'total': total_links})
+                    publish_event(project_id, 'progress', {'progress': status.progress, 'total_links': total_links})
+            finally:
+                executor.shutdown(cancel_futures=True)
 
         status.total_links = total_links
         status.save()
 
-        # Clean up links that no longer exist
-        BrokenLink.objects.filter(
-            analysis_result=analysis_result,
-            source_url__in=[url for url, _ in existing_links],
-            broken_url__in=[url for _, url in existing_links]
-        ).delete()
+        if is_partial:
+            status.error_message = "Analiz süre sınırına ulaştı; bazı linkler kontrol edilemedi ve önceki sonuçları korundu."
+
+        # Clean up links that no longer exist; kontrol edilmeyen çiftlerin eski kayıtları korunur
+        sitemap_pairs = set(BrokenLink.objects.filter(
+            analysis_result=analysis_result, context__startswith=SITEMAP_CONTEXT_PREFIX
+        ).values_list('source_url', 'broken_url'))
+        keep_unchecked_pairs(existing_links, url_table, content_source_ids, sitemap_pairs)
+        delete_link_pairs(analysis_result, existing_links)
 
         status.is_analyzing = False
         status.broken_links = BrokenLink.objects.filter(analysis_result=analysis_result).count()
@@ -154,10 +336,19 @@ def analyze_broken_links_task(self, project_id):
         status.task_id = None
         status.save()
 
+        record_analysis_run(analysis_result, previous_statuses, run_started_at, total_links, is_partial=is_partial)
+        publish_event(project_id, 'done', {
+            'is_analyzing': False,
+            'total_links': total_links,
+            'broken_links': status.broken_links,
+            'no_response_links': status.no_response_links,
+        })
+
         logger.info(f"Completed broken link analysis for project {project_id}. Found {status.broken_links} broken links out of {total_links} total links.")
 
     except Exception as e:
         logger.error(f"Error during analysis for project {project_id}: {str(e)}")
         status.is_analyzing = False
         status.error_message = str(e)
-        status.save()
\ No newline at end of file
+        status.save()
+        publish_event(project_id, 'error', {'is_analyzing': False, 'error_message': str(e)})
\ No newline at end of file
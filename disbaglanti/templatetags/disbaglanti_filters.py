@@ -1,4 +1,5 @@
 from django import template
+from ..utils import SOFT_404_STATUS
 
 register = template.Library()
 
@@ -21,4 +22,11 @@ def filter_no_response(broken_links):
     """
     Yanıt vermeyen bağlantıları döndüren filtre. Yanıt alamadığımız bağlantıları işaretler.
     """
-    return [link for link in broken_links if link.is_no_response]
\ No newline at end of file
+    return [link for link in broken_links if link.is_no_response]
+
+@register.filter
+def filter_soft_404(broken_links):
+    """
+    200 döndürüp host'un bulunamadı sayfasıyla eşleşen (soft 404) bağlantıları döndüren filtre.
+    """
+    return [link for link in broken_links if link.status_code == SOFT_404_STATUS]
\ No newline at end of file
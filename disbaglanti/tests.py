@@ -1,3 +1,501 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+from datetime import datetime, timezone as dt_timezone
+from unittest import mock, skipIf
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone
+from project_management.models import Project
+from internal_link_suggestions.models import Content
+from .models import AnalysisResult, AnalysisRun, BrokenLink, BrokenLinkAnalysisStatus, BrokenLinkChange
+from . import events
+from .linkstore import LinkRecords, UrlTable, decode_status, encode_status
+from .sitemaps import RobotsPolicy, iter_sitemap_urls
+from .tasks import analyze_broken_links_task, delete_link_pairs, keep_unchecked_pairs, record_analysis_run
+from requests.exceptions import ChunkedEncodingError
+from .views import analysis_changes, analysis_history, EXPORT_FIELDS, filter_broken_links_by_category, stream_csv, stream_ndjson
+from .utils import read_bounded, fingerprints_match, body_shingles, get_soft_404_fingerprint, check_soft_404, check_link
 
-# Create your tests here.
+
+NOT_FOUND_BODY = b'<title>Example</title><h1>Page not found</h1><p>The page you are looking for could not be found on this site.</p>'
+
+
+def make_fingerprint(size=1000, title=b'page not found', hash='abc', truncated=False, url='https://example.com/x', body=NOT_FOUND_BODY):
+    return {'size': size, 'title': title, 'hash': hash, 'truncated': truncated, 'url': url, 'shingles': body_shingles(body)}
+
+
+class ReadBoundedTests(SimpleTestCase):
+    def make_response(self, chunks):
+        response = mock.Mock()
+        response.iter_content.return_value = iter(chunks)
+        return response
+
+    def test_reads_whole_small_body(self):
+        response = self.make_response([b'a' * 10, b'b' * 10])
+        self.assertEqual(read_bounded(response, max_bytes=100), (b'a' * 10 + b'b' * 10, False))
+        response.close.assert_called_once()
+
+    def test_stops_and_flags_truncation_past_limit(self):
+        chunks = iter([b'x' * 60, b'y' * 60, b'z' * 60])
+        response = self.make_response(chunks)
+        body, truncated = read_bounded(response, max_bytes=100)
+        self.assertEqual(body, b'x' * 60 + b'y' * 40)
+        self.assertTrue(truncated)
+        self.assertEqual(next(chunks), b'z' * 60)
+        response.close.assert_called_once()
+
+    def test_body_of_exactly_limit_is_not_truncated(self):
+        response = self.make_response([b'a' * 100])
+        self.assertEqual(read_bounded(response, max_bytes=100), (b'a' * 100, False))
+
+
+class FingerprintsMatchTests(SimpleTestCase):
+    def test_identical_hash_matches(self):
+        self.assertTrue(fingerprints_match(make_fingerprint(title=b''), make_fingerprint(title=b'')))
+
+    def test_same_title_similar_size_and_body_matches(self):
+        candidate = make_fingerprint(size=1050, hash='a', body=NOT_FOUND_BODY + b'<span>csrf</span>')
+        self.assertTrue(fingerprints_match(candidate, make_fingerprint(size=1000, hash='b')))
+
+    def test_same_title_and_size_but_different_body_does_not_match(self):
+        body = b'<title>Example</title><h1>About us</h1><p>We have been building quality furniture in Istanbul since 1985.</p>'
+        candidate = make_fingerprint(size=1000, hash='a', body=body)
+        self.assertFalse(fingerprints_match(candidate, make_fingerprint(size=1000, hash='b')))
+
+    def test_same_title_but_different_size_does_not_match(self):
+        self.assertFalse(fingerprints_match(make_fingerprint(size=3000, hash='a'), make_fingerprint(size=1000, hash='b')))
+
+    def test_different_title_does_not_match(self):
+        self.assertFalse(fingerprints_match(make_fingerprint(title=b'about us', hash='a'), make_fingerprint(hash='b')))
+
+    def test_truncated_pages_never_match_on_size(self):
+        candidate = make_fingerprint(size=16384, truncated=True, hash='a')
+        reference = make_fingerprint(size=16384, truncated=True, hash='b')
+        self.assertFalse(fingerprints_match(candidate, reference))
+
+    def test_truncated_against_complete_page_does_not_match(self):
+        self.assertFalse(fingerprints_match(make_fingerprint(truncated=True), make_fingerprint()))
+
+    def test_truncated_pages_with_same_prefix_and_title_match(self):
+        self.assertTrue(fingerprints_match(make_fingerprint(truncated=True), make_fingerprint(truncated=True)))
+
+
+class SoftNotFoundProbeTests(SimpleTestCase):
+    def make_response(self, url, status_code=200, body=b'<title>Not found</title>'):
+        response = mock.Mock(status_code=status_code, url=url, headers={'Content-Type': 'text/html'})
+        response.iter_content.return_value = iter([body])
+        return response
+
+    @mock.patch('disbaglanti.utils.requests.get')
+    def test_probe_redirected_elsewhere_disables_host(self, get):
+        get.return_value = self.make_response('https://example.com/')
+        fingerprints = {}
+        self.assertIsNone(get_soft_404_fingerprint('https://example.com/page', fingerprints))
+        self.assertIn('https://example.com', fingerprints)
+
+    @mock.patch('disbaglanti.utils.requests.get')
+    def test_probe_is_fetched_once_per_host(self, get):
+        get.side_effect = lambda url, **kwargs: self.make_response(url)
+        fingerprints = {}
+        get_soft_404_fingerprint('https://example.com/a', fingerprints)
+        get_soft_404_fingerprint('https://example.com/b', fingerprints)
+        self.assertEqual(get.call_count, 1)
+        self.assertIsNotNone(fingerprints['https://example.com'])
+
+    @mock.patch('disbaglanti.utils.requests.get')
+    def test_matching_candidate_is_soft_404(self, get):
+        get.side_effect = lambda url, **kwargs: self.make_response(url)
+        result = check_soft_404('https://example.com/missing', {})
+        self.assertEqual(result['status'], 'Soft 404')
+
+    @mock.patch('disbaglanti.utils.requests.get')
+    def test_read_error_on_candidate_is_not_reported(self, get):
+        candidate = self.make_response('https://example.com/page')
+        candidate.iter_content.side_effect = ChunkedEncodingError()
+        get.side_effect = lambda url, **kwargs: candidate if url == 'https://example.com/page' else self.make_response(url)
+        fingerprints = {}
+        self.assertIsNone(check_soft_404('https://example.com/page', fingerprints))
+        self.assertIsNotNone(fingerprints['https://example.com'])
+
+
+def make_analysis_result():
+    project = Project.objects.create(name='Test project')
+    return AnalysisResult.objects.create(project=project)
+
+
+class BrokenLinkCategoryTests(TestCase):
+    def setUp(self):
+        self.analysis_result = make_analysis_result()
+        for broken_url, status_code, is_no_response in [
+            ('https://example.com/404', '404', False),
+            ('https://example.com/500', '500', False),
+            ('https://example.com/#', 'SEO Warning', False),
+            ('https://example.com/timeout', 'No Response', True),
+            ('https://example.com/soft', 'Soft 404', False),
+        ]:
+            BrokenLink.objects.create(
+                analysis_result=self.analysis_result,
+                source_url='https://example.com/',
+                broken_url=broken_url,
+                status_code=status_code,
+                is_no_response=is_no_response,
+            )
+
+    def category_urls(self, category):
+        links = filter_broken_links_by_category(self.analysis_result.broken_links.all(), category)
+        return sorted(links.values_list('broken_url', flat=True))
+
+    def test_categories(self):
+        self.assertEqual(self.category_urls('seo_warning'), ['https://example.com/#'])
+        self.assertEqual(self.category_urls('no_response'), ['https://example.com/timeout'])
+        self.assertEqual(self.category_urls('soft_404'), ['https://example.com/soft'])
+        self.assertEqual(self.category_urls('http_error'), ['https://example.com/404', 'https://example.com/500'])
+
+    def test_no_category_returns_everything(self):
+        self.assertEqual(len(self.category_urls(None)), 5)
+
+
+class ExportRowTests(SimpleTestCase):
+    rows = [
+        ('https://example.com/', 'https://example.com/404', '404', False, datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc), 'HTTP Error: 404'),
+        ('https://example.com/', 'https://example.com/x', 'No Response', True, datetime(2024, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc), None),
+    ]
+
+    def test_csv_rows(self):
+        lines = list(csv.reader(io.StringIO(''.join(stream_csv(iter(self.rows))))))
+        self.assertEqual(tuple(lines[0]), EXPORT_FIELDS)
+        self.assertEqual(lines[1], ['https://example.com/', 'https://example.com/404', '404', 'False', '2024-01-02T03:04:05+00:00', 'HTTP Error: 404'])
+        self.assertEqual(lines[2][-1], '')
+
+    def test_ndjson_rows(self):
+        records = [json.loads(line) for line in stream_ndjson(iter(self.rows))]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['checked_at'], '2024-01-02T03:04:05+00:00')
+        self.assertTrue(records[1]['is_no_response'])
+        self.assertIsNone(records[1]['context'])
+
+
+class AnalysisRunHistoryTests(TestCase):
+    def setUp(self):
+        self.analysis_result = make_analysis_result()
+
+    def add_link(self, source_url, broken_url, status_code='404'):
+        BrokenLink.objects.create(analysis_result=self.analysis_result, source_url=source_url, broken_url=broken_url, status_code=status_code)
+
+    def test_classifies_new_fixed_and_changed_links(self):
+        previous_statuses = {
+            ('https://a.com/', 'https://a.com/fixed'): '404',
+            ('https://a.com/', 'https://a.com/same'): '404',
+            ('https://a.com/', 'https://a.com/changed'): '404',
+        }
+        self.add_link('https://a.com/', 'https://a.com/same')
+        self.add_link('https://a.com/', 'https://a.com/changed', '500')
+        self.add_link('https://a.com/', 'https://a.com/new')
+
+        run = record_analysis_run(self.analysis_result, previous_statuses, timezone.now(), total_links=10)
+
+        self.assertEqual((run.new_count, run.fixed_count, run.changed_count, run.broken_links), (1, 1, 1, 3))
+        changes = {change.broken_url: change for change in run.changes.all()}
+        self.assertEqual(set(changes), {'https://a.com/fixed', 'https://a.com/changed', 'https://a.com/new'})
+        self.assertEqual(changes['https://a.com/new'].change_type, BrokenLinkChange.NEW)
+        self.assertEqual(changes['https://a.com/fixed'].change_type, BrokenLinkChange.FIXED)
+        self.assertEqual(changes['https://a.com/fixed'].old_status_code, '404')
+        self.assertEqual(changes['https://a.com/changed'].change_type, BrokenLinkChange.STATUS_CHANGED)
+        self.assertEqual((changes['https://a.com/changed'].old_status_code, changes['https://a.com/changed'].new_status_code), ('404', '500'))
+
+    def test_delete_link_pairs_only_deletes_exact_pairs(self):
+        self.add_link('https://a.com/', 'https://x.com/')
+        self.add_link('https://b.com/', 'https://y.com/')
+        self.add_link('https://a.com/', 'https://y.com/')
+
+        delete_link_pairs(self.analysis_result, {('https://a.com/', 'https://x.com/'), ('https://b.com/', 'https://y.com/')})
+
+        remaining = list(BrokenLink.objects.values_list('source_url', 'broken_url'))
+        self.assertEqual(remaining, [('https://a.com/', 'https://y.com/')])
+
+
+class AnalysisHistoryViewTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.analysis_result = make_analysis_result()
+        self.project_id = self.analysis_result.project_id
+        self.run = AnalysisRun.objects.create(analysis_result=self.analysis_result, new_count=3)
+        BrokenLinkChange.objects.bulk_create([
+            BrokenLinkChange(run=self.run, source_url='https://a.com/', broken_url=f'https://a.com/{i}', change_type=BrokenLinkChange.NEW, new_status_code='404')
+            for i in range(3)
+        ])
+
+    def get(self, view, **params):
+        return view(self.factory.get('/', params), self.project_id)
+
+    def test_invalid_parameters_return_400(self):
+        self.assertEqual(self.get(analysis_history, limit='abc').status_code, 400)
+        self.assertEqual(self.get(analysis_changes, run_id='abc').status_code, 400)
+        self.assertEqual(self.get(analysis_changes, offset='x').status_code, 400)
+
+    def test_negative_limit_is_clamped(self):
+        response = self.get(analysis_history, limit='-1')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(response.content)['runs']), 1)
+
+    def test_changes_are_paginated(self):
+        first = json.loads(self.get(analysis_changes, limit='2').content)
+        self.assertEqual(len(first['changes']), 2)
+        self.assertEqual(first['next_offset'], 2)
+        second = json.loads(self.get(analysis_changes, limit='2', offset='2').content)
+        self.assertEqual(len(second['changes']), 1)
+        self.assertIsNone(second['next_offset'])
+
+
+class ServerSentEventTests(SimpleTestCase):
+    def test_format_sse(self):
+        self.assertEqual(events.format_sse('progress', {'progress': 5}), 'event: progress\ndata: {"progress": 5}\n\n')
+
+    @mock.patch('disbaglanti.events.get_redis_client', return_value=None)
+    def test_stream_without_redis_sends_status_and_unavailable(self, get_redis_client):
+        status = {'is_analyzing': True, 'progress': 3}
+        chunks = list(events.stream_events(1, lambda: status))
+        self.assertTrue(chunks[0].startswith('retry: '))
+        self.assertEqual(chunks[1:], [events.format_sse('status', status), events.format_sse('unavailable', status)])
+
+    @mock.patch('disbaglanti.events.get_redis_client', return_value=None)
+    def test_publish_without_redis_is_noop(self, get_redis_client):
+        events.publish_event(1, 'progress', {'progress': 1})
+
+    @skipIf(events.redis is None, 'redis is not installed')
+    def test_publish_failure_disables_redis_for_a_while(self):
+        client = mock.Mock()
+        client.pipeline.return_value.execute.side_effect = events.redis.RedisError('down')
+        with mock.patch.object(events, '_clients', {events.REDIS_SOCKET_TIMEOUT: client}), mock.patch.object(events, '_disabled_until', 0):
+            events.publish_event(1, 'progress', {})
+            events.publish_event(1, 'progress', {})
+            self.assertEqual(client.pipeline.call_count, 1)
+            self.assertIsNone(events.get_redis_client())
+
+    def test_event_ids_are_emitted(self):
+        self.assertEqual(events.format_sse('progress', {}, '5-0'), 'id: 5-0\nevent: progress\ndata: {}\n\n')
+
+    def test_reconnect_replays_events_after_last_event_id(self):
+        client = mock.Mock()
+        client.xread.return_value = [[b'key', [
+            (b'7-0', {b'event': b'broken_link', b'data': b'{"broken_url": "https://a.com/x"}'}),
+            (b'8-0', {b'event': b'done', b'data': b'{}'}),
+        ]]]
+        with mock.patch('disbaglanti.events.get_redis_client', return_value=client):
+            chunks = list(events.stream_events(1, lambda: {'is_analyzing': True}, last_event_id='6-0', timeout=5))
+        self.assertEqual(client.xread.call_args[0][0], {events.project_stream(1): '6-0'})
+        client.xrevrange.assert_not_called()
+        self.assertEqual(chunks[2:], [
+            events.format_sse('broken_link', {'broken_url': 'https://a.com/x'}, '7-0'),
+            events.format_sse('done', {}, '8-0'),
+        ])
+
+    def test_new_connection_starts_after_latest_event(self):
+        client = mock.Mock()
+        client.xrevrange.return_value = [(b'9-0', {})]
+        client.xread.return_value = []
+        with mock.patch('disbaglanti.events.get_redis_client', return_value=client):
+            chunks = list(events.stream_events(1, lambda: {'is_analyzing': False}, timeout=5))
+        self.assertEqual(client.xread.call_args[0][0], {events.project_stream(1): '9-0'})
+        self.assertEqual(chunks[-1], events.format_sse('done', {'is_analyzing': False}))
+
+
+def make_sitemap_response(body, status_code=200):
+    response = mock.MagicMock(status_code=status_code)
+    response.__enter__.return_value = response
+    response.iter_content.return_value = [body[i:i + 10] for i in range(0, len(body), 10)]
+    return response
+
+
+class SitemapTests(SimpleTestCase):
+    urlset = (b'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+              b'<url><loc> https://a.com/1 </loc></url><url><loc>https://a.com/2</loc></url></urlset>')
+    index = (b'<?xml version="1.0"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+             b'<sitemap><loc>https://a.com/child.xml.gz</loc></sitemap></sitemapindex>')
+
+    @mock.patch('disbaglanti.sitemaps.requests.get')
+    def test_plain_sitemap(self, get):
+        get.return_value = make_sitemap_response(self.urlset)
+        self.assertEqual(list(iter_sitemap_urls('https://a.com/sitemap.xml')), ['https://a.com/1', 'https://a.com/2'])
+
+    @mock.patch('disbaglanti.sitemaps.requests.get')
+    def test_gzip_sitemap(self, get):
+        get.return_value = make_sitemap_response(gzip.compress(self.urlset))
+        self.assertEqual(list(iter_sitemap_urls('https://a.com/sitemap.xml.gz')), ['https://a.com/1', 'https://a.com/2'])
+
+    @mock.patch('disbaglanti.sitemaps.requests.get')
+    def test_sitemap_index_is_followed(self, get):
+        responses = {
+            'https://a.com/sitemap.xml': self.index,
+            'https://a.com/child.xml.gz': gzip.compress(self.urlset),
+        }
+        get.side_effect = lambda url, **kwargs: make_sitemap_response(responses[url])
+        self.assertEqual(list(iter_sitemap_urls('https://a.com/sitemap.xml')), ['https://a.com/1', 'https://a.com/2'])
+
+    @mock.patch('disbaglanti.sitemaps.requests.get')
+    def test_missing_or_invalid_sitemap_yields_nothing(self, get):
+        get.return_value = make_sitemap_response(b'', status_code=404)
+        self.assertEqual(list(iter_sitemap_urls('https://a.com/sitemap.xml')), [])
+        get.return_value = make_sitemap_response(b'<urlset><url><loc>https://a.com/1</loc>')
+        self.assertEqual(list(iter_sitemap_urls('https://a.com/sitemap.xml')), ['https://a.com/1'])
+
+
+class RobotsPolicyTests(SimpleTestCase):
+    robots = 'User-agent: *\nDisallow: /private\nCrawl-delay: 2\nSitemap: https://a.com/custom-sitemap.xml\n'
+
+    def setUp(self):
+        patcher = mock.patch('disbaglanti.sitemaps.requests.get', return_value=mock.Mock(status_code=200, text=self.robots))
+        self.get = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rules_and_sitemaps(self):
+        policy = RobotsPolicy()
+        self.assertTrue(policy.can_fetch('https://a.com/page'))
+        self.assertFalse(policy.can_fetch('https://a.com/private/page'))
+        self.assertEqual(policy.crawl_delay('https://a.com/page'), 2)
+        self.assertEqual(policy.sitemaps('https://a.com/'), ['https://a.com/custom-sitemap.xml'])
+        self.assertEqual(self.get.call_count, 1)
+
+    @mock.patch('disbaglanti.sitemaps.time.sleep')
+    def test_wait_applies_crawl_delay_between_requests(self, sleep):
+        policy = RobotsPolicy()
+        policy.wait('https://a.com/1')
+        policy.wait('https://a.com/2')
+        self.assertEqual(sleep.call_count, 1)
+        self.assertLessEqual(sleep.call_args[0][0], 2)
+
+    def test_slot_serializes_hosts_with_crawl_delay(self):
+        policy = RobotsPolicy()
+        with policy.slot('https://a.com/1'):
+            self.assertEqual(policy.semaphores['https://a.com']._value, 0)
+        self.assertEqual(policy.semaphores['https://a.com']._value, 1)
+
+    def test_robots_is_fetched_outside_policy_lock(self):
+        policy = RobotsPolicy()
+        with mock.patch('disbaglanti.sitemaps.fetch_robots', side_effect=lambda host: self.assertFalse(policy.lock.locked())) as fetch_robots:
+            policy.get_parser('https://b.com/')
+            policy.get_parser('https://b.com/other')
+        fetch_robots.assert_called_once_with('https://b.com')
+
+    @mock.patch('disbaglanti.utils.requests.get')
+    @mock.patch('disbaglanti.utils.requests.head')
+    def test_check_link_throttles_every_request(self, head, get):
+        head.return_value = mock.Mock(status_code=405)
+        get.return_value = mock.Mock(status_code=200)
+        throttle = mock.Mock()
+        self.assertIsNone(check_link('https://a.com/page', 'https://a.com/', throttle=throttle))
+        self.assertEqual(throttle.call_count, 2)
+
+    def test_missing_robots_allows_everything(self):
+        self.get.return_value = mock.Mock(status_code=404, text='')
+        policy = RobotsPolicy()
+        self.assertTrue(policy.can_fetch('https://a.com/private/page'))
+        self.assertEqual(policy.crawl_delay('https://a.com/page'), 0)
+        self.assertEqual(policy.sitemaps('https://a.com/page'), ['https://a.com/sitemap.xml'])
+
+
+class LinkStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.url_table = UrlTable()
+        self.records = LinkRecords(self.url_table)
+
+    def add_checked(self, source_url, target_url, result):
+        index = self.records.add(source_url, target_url)
+        self.url_table.set_result(self.records.targets[index], result)
+        return index
+
+    def test_urls_are_interned_once(self):
+        self.records.add('https://a.com/', 'https://a.com/x')
+        self.records.add('https://a.com/', 'https://a.com/x')
+        self.records.add('https://a.com/x', 'https://a.com/')
+        self.assertEqual(len(self.url_table), 2)
+        self.assertEqual(len(self.records), 3)
+
+    def test_status_round_trip(self):
+        for status in ['404', '500', 'No Response', 'SEO Warning', 'Soft 404']:
+            self.assertEqual(decode_status(encode_status(status)), status)
+
+    def test_iter_broken_skips_valid_unchecked_and_skipped_targets(self):
+        self.add_checked('https://a.com/', 'https://a.com/ok', None)
+        self.add_checked('https://a.com/', 'https://a.com/404', {'status': '404', 'context': 'HTTP Error: 404'})
+        self.records.add('https://a.com/', 'https://a.com/unchecked')
+        index = self.records.add('https://a.com/', 'https://a.com/skipped')
+        self.url_table.set_skipped(self.records.targets[index])
+        self.assertEqual(list(self.records.iter_broken()), [('https://a.com/', 'https://a.com/404', '404', 'HTTP Error: 404')])
+
+    def test_iter_broken_deduplicates_pairs(self):
+        result = {'status': 'No Response', 'context': 'Request timed out'}
+        self.add_checked('https://a.com/', 'https://a.com/down', result)
+        self.records.add('https://a.com/', 'https://a.com/down')
+        self.records.add('https://a.com/other', 'https://a.com/down')
+        self.assertEqual(list(self.records.iter_broken()), [
+            ('https://a.com/', 'https://a.com/down', 'No Response', 'Request timed out'),
+            ('https://a.com/other', 'https://a.com/down', 'No Response', 'Request timed out'),
+        ])
+
+    def test_iter_broken_from_start_index(self):
+        self.add_checked('https://a.com/', 'https://a.com/404', {'status': '404', 'context': ''})
+        start = len(self.records)
+        self.records.add('https://a.com/page', 'https://a.com/404')
+        self.assertEqual([link[0] for link in self.records.iter_broken(start)], ['https://a.com/page'])
+
+
+class KeepUncheckedPairsTests(SimpleTestCase):
+    def setUp(self):
+        self.url_table = UrlTable()
+        self.content_source_ids = {self.url_table.intern('https://a.com/')}
+
+    def set_result(self, url, result):
+        self.url_table.set_result(self.url_table.intern(url), result)
+
+    def test_pairs(self):
+        broken = {'status': '404', 'context': ''}
+        self.set_result('https://a.com/fixed', None)
+        self.set_result('https://a.com/still-broken', broken)
+        self.url_table.set_skipped(self.url_table.intern('https://a.com/disallowed'))
+        sitemap_pairs = {('https://a.com/sitemap.xml', 'https://a.com/unread'), ('https://a.com/sitemap.xml', 'https://a.com/still-broken'),
+                         ('https://a.com/sitemap.xml', 'https://a.com/fixed')}
+        existing_links = sitemap_pairs | {
+            ('https://a.com/', 'https://a.com/disallowed'),
+            ('https://a.com/', 'https://a.com/fixed'),
+            ('https://a.com/', 'https://a.com/removed-from-page'),
+            ('https://a.com/deleted-page', 'https://a.com/disallowed'),
+        }
+
+        keep_unchecked_pairs(existing_links, self.url_table, self.content_source_ids, sitemap_pairs)
+
+        self.assertEqual(existing_links, {
+            ('https://a.com/sitemap.xml', 'https://a.com/fixed'),
+            ('https://a.com/', 'https://a.com/fixed'),
+            ('https://a.com/', 'https://a.com/removed-from-page'),
+            ('https://a.com/deleted-page', 'https://a.com/disallowed'),
+        })
+
+
+class TruncatedAnalysisTests(TestCase):
+    def test_budget_truncated_run_keeps_unchecked_broken_links(self):
+        analysis_result = make_analysis_result()
+        project = analysis_result.project
+        Content.objects.create(project=project, url='https://a.com/', raw_content='<a href="/content-404">x</a>')
+        BrokenLink.objects.create(analysis_result=analysis_result, source_url='https://a.com/', broken_url='https://a.com/content-404', status_code='404')
+        BrokenLink.objects.create(
+            analysis_result=analysis_result, source_url='https://a.com/sitemap.xml', broken_url='https://a.com/old-page',
+            status_code='404', context='Listed in sitemap https://a.com/sitemap.xml\nHTTP Error: 404',
+        )
+        robots = mock.Mock(status_code=404, text='')
+
+        with mock.patch('disbaglanti.tasks.ANALYSIS_TIME_BUDGET', -1), \
+                mock.patch('disbaglanti.tasks.publish_event'), \
+                mock.patch('disbaglanti.tasks.check_link') as check_link, \
+                mock.patch('disbaglanti.sitemaps.requests.get', return_value=robots) as get, \
+                mock.patch.object(analyze_broken_links_task, 'update_state'):
+            analyze_broken_links_task(project.id, discover_sitemaps=True)
+
+        check_link.assert_not_called()
+        self.assertEqual([call.args[0] for call in get.call_args_list], ['https://a.com/robots.txt'])
+        self.assertEqual(BrokenLink.objects.filter(analysis_result=analysis_result).count(), 2)
+        run = AnalysisRun.objects.get(analysis_result=analysis_result)
+        self.assertTrue(run.is_partial)
+        self.assertEqual((run.new_count, run.fixed_count, run.changed_count), (0, 0, 0))
+        self.assertTrue(BrokenLinkAnalysisStatus.objects.get(project=project).error_message)
@@ -4,7 +4,11 @@ app_name = 'disbaglanti'
 urlpatterns = [
     path('<int:project_id>/broken-link-analysis/', views.broken_link_analysis, name='broken_link_analysis'),
     path('<int:project_id>/check-broken-link-status/', views.check_broken_link_status, name='check_broken_link_status'),
+    path('<int:project_id>/analysis-events/', views.analysis_events, name='analysis_events'),
     path('<int:project_id>/cancel-analysis/', views.cancel_analysis, name='cancel_analysis'),
     path('<int:project_id>/get-analysis-results/', views.get_analysis_results, name='get_analysis_results'),
+    path('<int:project_id>/export-analysis-results/', views.export_analysis_results, name='export_analysis_results'),
+    path('<int:project_id>/analysis-history/', views.analysis_history, name='analysis_history'),
+    path('<int:project_id>/analysis-changes/', views.analysis_changes, name='analysis_changes'),
     path('reset-analysis-counters/<int:project_id>/', views.reset_analysis_counters, name='reset_analysis_counters'),
 ]
\ No newline at end of file
@@ -7,9 +7,23 @@ from urllib.parse import urlparse, urljoin
 import re
 from requests.exceptions import RequestException, SSLError, Timeout
 import time
+import hashlib
+import uuid
+import zlib
 
 logger = get_task_logger(__name__)
 
+SOFT_404_STATUS = 'Soft 404'
+SOFT_404_READ_BYTES = 16 * 1024
+SOFT_404_SIZE_TOLERANCE = 0.1
+SOFT_404_MIN_SIMILARITY = 0.9
+SHINGLE_WORDS = 5
+TITLE_RE = re.compile(rb'<title[^>]*>(.*?)</title>', re.I | re.S)
+TAG_RE = re.compile(rb'<(script|style)[^>]*>.*?</\1>|<[^>]+>', re.I | re.S)
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
 def get_link_context(soup, link):
     try:
         # Linkin kendisini al
@@ -31,6 +45,16 @@ def get_link_context(soup, link):
     except Exception as e:
         return f"Error getting context: {str(e)}"
 
+def extract_link_urls(raw_content):
+    """
+    HTML içindeki href/src değerlerini döndürür. Tag nesneleri tutulmaz; soup işlem sonunda serbest bırakılır.
+    """
+    soup = BeautifulSoup(raw_content, 'html.parser')
+    urls = [tag.get('href') or tag.get('src') for tag in soup.find_all(['a', 'link', 'script', 'img'], href=True)]
+    urls += [tag.get('src') for tag in soup.find_all(['a', 'link', 'script', 'img'], src=True)]
+    soup.decompose()
+    return urls
+
 def is_valid_url(url):
     try:
         result = urlparse(url)
@@ -48,7 +72,122 @@ def should_check_link(url):
     return True
       
 
-def check_link(url, source_url, max_retries=3, backoff_factor=0.3):
+def read_bounded(response, max_bytes=SOFT_404_READ_BYTES):
+    """
+    Stream modunda açılmış bir yanıttan en fazla max_bytes okur, gövdenin geri kalanını indirmez.
+    (gövde, gövde kesildi mi) döndürür.
+    """
+    body = b''
+    truncated = False
+    try:
+        for chunk in response.iter_content(chunk_size=4096):
+            body += chunk
+            if len(body) > max_bytes:
+                truncated = True
+                break
+    finally:
+        response.close()
+    return body[:max_bytes], truncated
+
+def body_shingles(body):
+    """
+    Gövdenin görünür metnindeki ardışık SHINGLE_WORDS kelimelik grupların hash kümesini döndürür.
+    """
+    words = TAG_RE.sub(b' ', body).lower().split()
+    if len(words) < SHINGLE_WORDS:
+        return frozenset([zlib.crc32(b' '.join(words))])
+    return frozenset(zlib.crc32(b' '.join(words[i:i + SHINGLE_WORDS])) for i in range(len(words) - SHINGLE_WORDS + 1))
+
+def shingle_similarity(first, second):
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+def fingerprint_response(response, max_bytes=SOFT_404_READ_BYTES):
+    """
+    Yanıtın okunan boyutu, başlığı, ilk max_bytes baytının hash'i ve kelime grupları (shingle) ile son URL'sinden
+    oluşan parmak izini döndürür. Boyut her iki taraf için de okunan bayt sayısıdır; Content-Length kullanılmaz.
+    """
+    body, truncated = read_bounded(response, max_bytes)
+    title_match = TITLE_RE.search(body)
+    title = b' '.join(title_match.group(1).split()).lower() if title_match else b''
+    return {
+        'size': len(body),
+        'truncated': truncated,
+        'title': title,
+        'hash': hashlib.sha1(body).hexdigest(),
+        'shingles': body_shingles(body),
+        'url': response.url,
+    }
+
+def fingerprints_match(candidate, reference, tolerance=SOFT_404_SIZE_TOLERANCE):
+    """
+    Aday sayfa, host'un bulunamadı sayfasıyla aynı içeriğe sahipse True döner. Aynı başlık ve benzer boyut tek başına
+    yeterli değildir (birçok site her sayfada aynı başlığı kullanır); gövde metni de SOFT_404_MIN_SIMILARITY oranında
+    benzer olmalıdır.
+    """
+    if candidate['truncated'] or reference['truncated']:
+        # Kesilmiş gövdelerde boyut anlamsızdır; yalnızca aynı başlık ve aynı ilk baytlar eşleşme sayılır
+        return (candidate['truncated'] and reference['truncated'] and bool(candidate['title'])
+                and candidate['title'] == reference['title'] and candidate['hash'] == reference['hash'])
+    if candidate['hash'] == reference['hash']:
+        return True
+    if not candidate['title'] or candidate['title'] != reference['title']:
+        return False
+    largest = max(candidate['size'], reference['size'], 1)
+    if abs(candidate['size'] - reference['size']) / largest > tolerance:
+        return False
+    return shingle_similarity(candidate['shingles'], reference['shingles']) >= SOFT_404_MIN_SIMILARITY
+
+def get_soft_404_fingerprint(url, fingerprints, throttle=None):
+    """
+    Host için bir kez, var olmadığı bilinen bir URL çekilir ve parmak izi fingerprints sözlüğünde saklanır.
+    Host gerçek 404 döndürüyorsa veya bilinmeyen yolları başka bir sayfaya (ör. ana sayfa) yönlendiriyorsa
+    None saklanır; bu host için soft 404 kontrolü yapılmaz.
+    """
+    parsed = urlparse(url)
+    host = f"{parsed.scheme}://{parsed.netloc}"
+    if host not in fingerprints:
+        fingerprint = None
+        probe_url = f"{host}/{uuid.uuid4().hex}-disbaglanti-soft404"
+        try:
+            if throttle:
+                throttle(probe_url)
+            response = requests.get(probe_url, timeout=10, allow_redirects=True, headers=REQUEST_HEADERS, stream=True)
+            if response.status_code < 400 and urlparse(response.url).path == urlparse(probe_url).path:
+                fingerprint = fingerprint_response(response)
+            else:
+                response.close()
+        except RequestException as e:
+            logger.warning(f"Soft 404 probe failed for {host}: {str(e)}")
+        fingerprints[host] = fingerprint
+    return fingerprints[host]
+
+def check_soft_404(url, fingerprints, throttle=None):
+    reference = get_soft_404_fingerprint(url, fingerprints, throttle)
+    if reference is None:
+        return None
+    try:
+        if throttle:
+            throttle(url)
+        response = requests.get(url, timeout=10, allow_redirects=True, headers=REQUEST_HEADERS, stream=True)
+        if response.status_code >= 400 or 'html' not in response.headers.get('Content-Type', 'text/html'):
+            response.close()
+            return None
+        candidate = fingerprint_response(response)
+    except RequestException:
+        return None
+    if candidate['url'] == reference['url']:
+        return None
+    if fingerprints_match(candidate, reference):
+        return {'status': SOFT_404_STATUS, 'context': "The page returns 200 but matches the host's not-found page."}
+    return None
+
+def check_link(url, source_url, max_retries=3, backoff_factor=0.3, soft_404_fingerprints=None, throttle=None):
+    """
+    soft_404_fingerprints verilirse (host -> parmak izi sözlüğü) geçerli görünen sayfalar soft 404 için de kontrol edilir.
+    throttle verilirse (ör. crawl-delay için RobotsPolicy.wait) host'a giden her istekten önce URL ile çağrılır.
+    """
     # Check for fragment identifiers (#)
     if url == '#' or (not is_valid_url(url) and '#' in url):
         return {'status': 'SEO Warning', 'context': "The link contains only '#' or is not a valid URL with '#'. This may not provide value for SEO purposes."}
@@ -59,17 +198,21 @@ def check_link(url, source_url, max_retries=3, backoff_factor=0.3):
     if not should_check_link(url):
         return None
 
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    headers = REQUEST_HEADERS
     for i in range(max_retries):
         try:
+            if throttle:
+                throttle(url)
             response = requests.head(url, timeout=10, allow_redirects=True, headers=headers)
             if response.status_code == 405:
                 # If HEAD request is not allowed, try GET
+                if throttle:
+                    throttle(url)
                 response = requests.get(url, timeout=10, allow_redirects=True, headers=headers)
             if response.status_code >= 400:
                 return {'status': str(response.status_code), 'context': f"HTTP Error: {response.status_code}"}
+            if soft_404_fingerprints is not None:
+                return check_soft_404(url, soft_404_fingerprints, throttle)
             return None  # Link is valid
         except (SSLError, Timeout):
             if i == max_retries - 1:
@@ -1,12 +1,20 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from project_management.models import Project
-from .models import BrokenLink, BrokenLinkAnalysisStatus, AnalysisResult
+from .models import BrokenLink, BrokenLinkAnalysisStatus, AnalysisResult, AnalysisRun
 from .tasks import analyze_broken_links_task
+from .utils import SOFT_404_STATUS
+from .events import stream_events, publish_event
 from celery.result import AsyncResult
 from django.template.loader import render_to_string
 from django.db import transaction
 from django.views.decorators.http import require_http_methods
+import csv
+import json
+
+EXPORT_FIELDS = ('source_url', 'broken_url', 'status_code', 'is_no_response', 'checked_at', 'context')
+EXPORT_CHUNK_SIZE = 2000
+CHANGES_PAGE_SIZE = 1000
 
 def start_broken_link_analysis(request, project_id):
     project = get_object_or_404(Project, id=project_id)
@@ -72,12 +80,13 @@ def get_analysis_results(request, project_id):
     
     if analysis_result:
         broken_links = analysis_result.broken_links.all()
-        seo_warnings = broken_links.filter(status_code='SEO Warning').count()
-        no_response_links = broken_links.filter(is_no_response=True).count()
-        http_errors = broken_links.exclude(status_code='SEO Warning').exclude(is_no_response=True).count()
+        seo_warnings = filter_broken_links_by_category(broken_links, 'seo_warning').count()
+        no_response_links = filter_broken_links_by_category(broken_links, 'no_response').count()
+        soft_404_links = filter_broken_links_by_category(broken_links, 'soft_404').count()
+        http_errors = filter_broken_links_by_category(broken_links, 'http_error').count()
     else:
         broken_links = []
-        seo_warnings = no_response_links = http_errors = 0
+        seo_warnings = no_response_links = soft_404_links = http_errors = 0
     
     context = {
         'project': project,
@@ -85,11 +94,128 @@ def get_analysis_results(request, project_id):
         'broken_links': broken_links,
         'seo_warnings': seo_warnings,
         'no_response_links': no_response_links,
+        'soft_404_links': soft_404_links,
         'http_errors': http_errors,
     }
     
     html = render_to_string('disbaglanti/analysis_results.html', context)
     return JsonResponse({'html': html})
+
+class Echo:
+    """csv.writer için satırı biriktirmeden geri döndüren sahte dosya nesnesi."""
+    def write(self, value):
+        return value
+
+def filter_broken_links_by_category(broken_links, category):
+    if category == 'seo_warning':
+        return broken_links.filter(status_code='SEO Warning')
+    if category == 'no_response':
+        return broken_links.filter(is_no_response=True)
+    if category == 'soft_404':
+        return broken_links.filter(status_code=SOFT_404_STATUS)
+    if category == 'http_error':
+        return broken_links.exclude(status_code__in=['SEO Warning', SOFT_404_STATUS]).exclude(is_no_response=True)
+    return broken_links
+
+def iter_export_rows(broken_links):
+    # iterator() PostgreSQL'de sunucu tarafı cursor kullanır; sonuçlar belleğe toplu alınmaz
+    return broken_links.order_by('id').values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield writer.writerow(row[:-2] + (row[-2].isoformat(), row[-1] or ''))
+
+def stream_ndjson(rows):
+    for row in rows:
+        record = dict(zip(EXPORT_FIELDS, row))
+        record['checked_at'] = record['checked_at'].isoformat()
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+@require_http_methods(["GET"])
+def export_analysis_results(request, project_id):
+    project = get_object_or_404(Project, id=project_id)
+    export_format = request.GET.get('format', 'csv')
+    category = request.GET.get('category')
+    if export_format not in ('csv', 'ndjson'):
+        return JsonResponse({'error': 'Unsupported format'}, status=400)
+    if category not in (None, '', 'seo_warning', 'no_response', 'soft_404', 'http_error'):
+        return JsonResponse({'error': 'Unsupported category'}, status=400)
+
+    analysis_result = AnalysisResult.objects.filter(project=project).order_by('-last_updated').first()
+    if analysis_result:
+        broken_links = filter_broken_links_by_category(analysis_result.broken_links.all(), category)
+    else:
+        broken_links = BrokenLink.objects.none()
+    rows = iter_export_rows(broken_links)
+
+    if export_format == 'csv':
+        response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="broken-links-{project.id}.{export_format}"'
+    return response
+
+@require_http_methods(["GET"])
+def analysis_history(request, project_id):
+    project = get_object_or_404(Project, id=project_id)
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 30)), 365))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit'}, status=400)
+    runs = AnalysisRun.objects.filter(analysis_result__project=project).order_by('-started_at')[:limit]
+    return JsonResponse({
+        'runs': [
+            {
+                'id': run.id,
+                'started_at': run.started_at.isoformat(),
+                'finished_at': run.finished_at.isoformat() if run.finished_at else None,
+                'total_links': run.total_links,
+                'broken_links': run.broken_links,
+                'no_response_links': run.no_response_links,
+                'new': run.new_count,
+                'fixed': run.fixed_count,
+                'status_changed': run.changed_count,
+                'is_partial': run.is_partial,
+            } for run in runs
+        ]
+    })
+
+@require_http_methods(["GET"])
+def analysis_changes(request, project_id):
+    # run_id verilmezse son çalıştırmadaki değişiklikler (bir önceki çalıştırmaya göre) döndürülür
+    project = get_object_or_404(Project, id=project_id)
+    try:
+        run_id = int(request.GET['run_id']) if request.GET.get('run_id') else None
+        offset = max(0, int(request.GET.get('offset', 0)))
+        limit = max(1, min(int(request.GET.get('limit', CHANGES_PAGE_SIZE)), CHANGES_PAGE_SIZE))
+    except ValueError:
+        return JsonResponse({'error': 'Invalid run_id, offset or limit'}, status=400)
+
+    runs = AnalysisRun.objects.filter(analysis_result__project=project)
+    run = get_object_or_404(runs, id=run_id) if run_id is not None else runs.order_by('-started_at').first()
+    if run is None:
+        return JsonResponse({'run': None, 'changes': [], 'next_offset': None})
+
+    changes = run.changes.order_by('id')
+    change_type = request.GET.get('change_type')
+    if change_type:
+        changes = changes.filter(change_type=change_type)
+    # İlk çalıştırmada tüm kırık linkler "yeni" olduğundan değişiklikler sayfalanarak döndürülür
+    page = list(changes.values('source_url', 'broken_url', 'change_type', 'old_status_code', 'new_status_code')[offset:offset + limit + 1])
+    return JsonResponse({
+        'run': {
+            'id': run.id,
+            'started_at': run.started_at.isoformat(),
+            'new': run.new_count,
+            'fixed': run.fixed_count,
+            'status_changed': run.changed_count,
+        },
+        'changes': page[:limit],
+        'next_offset': offset + limit if len(page) > limit else None,
+    })
+
 def broken_link_analysis(request, project_id):
     project = get_object_or_404(Project, id=project_id)
     status, created = BrokenLinkAnalysisStatus.objects.get_or_create(project=project)
@@ -100,7 +226,9 @@ def broken_link_analysis(request, project_id):
             status.processed_urls = 0
             status.save()
             # Analizi başlat
-            task = analyze_broken_links_task.delay(project_id)
+            detect_soft_404 = request.POST.get('detect_soft_404') in ('1', 'true', 'on')
+            discover_sitemaps = request.POST.get('discover_sitemaps') in ('1', 'true', 'on')
+            task = analyze_broken_links_task.delay(project_id, detect_soft_404=detect_soft_404, discover_sitemaps=discover_sitemaps)
             status.task_id = task.id
             status.is_analyzing = True
             status.save()
@@ -153,6 +281,28 @@ def check_broken_link_analysis_status(request, project_id):
         'last_analysis': status.last_analysis.isoformat() if status.last_analysis else None,
     })
 
+@require_http_methods(["GET"])
+def analysis_events(request, project_id):
+    """
+    Analiz ilerlemesini ve yeni bulunan kırık linkleri server-sent events ile iletir.
+    Senkron bir akış olduğundan açık her sekme bağlantı süresince (BROKEN_LINK_EVENTS_POLL_TIMEOUT) bir worker'ı
+    meşgul eder; yalnızca ASGI veya gevent/eventlet worker'ları arkasında kullanılmalıdır. Senkron WSGI
+    worker'larında bu süre kısa tutulmalıdır.
+    """
+    project = get_object_or_404(Project, id=project_id)
+
+    def get_status():
+        status = BrokenLinkAnalysisStatus.objects.filter(project=project).values(
+            'is_analyzing', 'progress', 'total_links', 'broken_links', 'no_response_links', 'error_message'
+        ).first()
+        return status or {'is_analyzing': False}
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    response = StreamingHttpResponse(stream_events(project_id, get_status, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @require_http_methods(["GET"])
 def check_broken_link_status(request, project_id):
     try:
@@ -206,6 +356,7 @@ def cancel_analysis(request, project_id):
         status.is_analyzing = False
         status.error_message = "Analiz kullanıcı tarafından iptal edildi."
         status.save()
+        publish_event(project.id, 'error', {'is_analyzing': False, 'error_message': status.error_message})
         return JsonResponse({'status': 'cancelled'})
     else:
         return JsonResponse({'status': 'not_analyzing'})